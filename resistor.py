@@ -2,6 +2,19 @@ import math
 from dataclasses import dataclass
 from enum import Enum, IntEnum
 from functools import cached_property
+from typing import Final
+
+# powers of ten for the exponents resistor values need, indexed by exponent - _POW10_MIN
+_POW10_MIN = -12
+_POW10_MAX = 12
+_POW10 = tuple(10.0**i for i in range(_POW10_MIN, _POW10_MAX + 1))
+
+
+def _pow10(exponent: int) -> float:
+    """Return 10.0**exponent, looked up from a table when the exponent is in the usual range"""
+    if _POW10_MIN <= exponent <= _POW10_MAX:
+        return _POW10[exponent - _POW10_MIN]
+    return 10.0**exponent
 
 
 @dataclass
@@ -13,11 +26,25 @@ class Fixed:
     def from_float(cls, val: float, places: int):
         base_exponent = math.floor(math.log10(val))
         exponent = int(base_exponent - places)
-        mantissa = int(round(val / 10**exponent))
+        mantissa = int(round(val / _pow10(exponent)))
         return cls(mantissa, exponent)
 
     def as_float(self):
-        return float(self.mantissa) * 10**self.exponent
+        return float(self.mantissa) * _pow10(self.exponent)
+
+    def normalized(self, digits: int):
+        """Return the same value with exactly `digits` significant digits in the mantissa, rounding half to even
+        in integer arithmetic when digits have to be dropped"""
+        if self.mantissa == 0:
+            raise ValueError(f"Zero has no significant digits to normalize to {digits}.")
+        shift = len(str(abs(self.mantissa))) - digits
+        if shift <= 0:
+            return type(self)(self.mantissa * 10**-shift, self.exponent + shift)
+        mantissa = round(self.mantissa, -shift) // 10**shift
+        if abs(mantissa) >= 10**digits:  # rounded up to an extra digit, e.g. 9996 -> 1000
+            mantissa //= 10
+            shift += 1
+        return type(self)(mantissa, self.exponent + shift)
 
 
 class ValueColor(IntEnum):
@@ -47,9 +74,29 @@ class ExponentColor(IntEnum):
     silver = -2
     pink = -3
 
-    @cached_property
+    @property
     def multiplier(self):
-        return 10.0**self.value
+        return _EXP_MULT[self]
+
+
+_EXP_MULT: dict[ExponentColor, float] = {color: _pow10(color.value) for color in ExponentColor}
+
+# color names indexed by digit value and keyed by exponent, for converting values to bands without Enum lookups
+_VALUE_NAMES: Final = tuple(color.name for color in sorted(ValueColor))
+_EXP_NAMES: Final = {color.value: color.name for color in ExponentColor}
+
+
+def _value_name(digit: int) -> str:
+    if not 0 <= digit < len(_VALUE_NAMES):
+        raise ValueError(f"{digit} is not a valid ValueColor")
+    return _VALUE_NAMES[digit]
+
+
+def _exponent_name(exponent: int) -> str:
+    try:
+        return _EXP_NAMES[exponent]
+    except KeyError:
+        raise ValueError(f"{exponent} is not a valid ExponentColor") from None
 
 
 class TolerancePercentColor(float, Enum):
@@ -65,17 +112,20 @@ class TolerancePercentColor(float, Enum):
     none = 20.0
 
 
+# SI prefixes available to si_prefixer as (exponent, prefix), largest first
+_SI_PREFIXES: Final = (
+    (6, "M"),
+    (3, "k"),
+)
+
+
 def si_prefixer(value: float) -> tuple[float, str]:
-    prefixes = {
-        3: "k",
-        6: "M",
-    }
-    for exp, prefix in sorted(prefixes.items(), reverse=True):
-        if math.floor(value / 10**exp):
+    for exp, prefix in _SI_PREFIXES:
+        if value >= _pow10(exp):
             break
     else:
         raise ValueError(f"Couldn't find prefix for {value}.")
-    return value / 10**exp, prefix
+    return value / _pow10(exp), prefix
 
 
 @dataclass
@@ -98,20 +148,20 @@ class ResistorValue:
         exp_val = ExponentColor[exponent]
         return cls(Fixed(value, exp_val))
 
+    @cached_property
     def as_three_bands(self) -> tuple[str, str, str]:
-        dec = Fixed.from_float(self.fixed.as_float(), 1)
-        first = ValueColor(dec.mantissa // 10)
-        second = ValueColor(dec.mantissa % 10)
-        exponent = ExponentColor(dec.exponent)
-        return first.name, second.name, exponent.name
+        dec = self.fixed.normalized(2)
+        return _value_name(dec.mantissa // 10), _value_name(dec.mantissa % 10), _exponent_name(dec.exponent)
 
+    @cached_property
     def as_four_bands(self) -> tuple[str, str, str, str]:
-        fixed = Fixed.from_float(self.fixed.as_float(), 2)
-        first = ValueColor(fixed.mantissa // 100)
-        second = ValueColor((fixed.mantissa - (first * 100)) // 10)
-        third = ValueColor(fixed.mantissa % 10)
-        exponent = ExponentColor(fixed.exponent)
-        return first.name, second.name, third.name, exponent.name
+        fixed = self.fixed.normalized(3)
+        return (
+            _value_name(fixed.mantissa // 100),
+            _value_name(fixed.mantissa // 10 % 10),
+            _value_name(fixed.mantissa % 10),
+            _exponent_name(fixed.exponent),
+        )
 
     @property
     def value(self) -> float:
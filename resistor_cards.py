@@ -1,23 +1,57 @@
-from dataclasses import dataclass
+import os
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Final, Iterable
+from typing import Any, Final, Iterable, Sequence
 
 import matplotlib
-import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from PIL import Image
 
 from resistor import ResistorValue, TolerancePercentColor
 
 matplotlib.use("Agg")
+# the cards only need plain Agg text and paths, so pin the features that could otherwise slow down drawing
+matplotlib.rcParams.update(
+    {
+        "text.usetex": False,
+        "axes.unicode_minus": False,
+        "path.simplify": True,
+        "path.simplify_threshold": 1.0,
+        "agg.path.chunksize": 0,
+    }
+)
 
 E_12: list[float] = [1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2]
 EXTRAS: list[float] = [3.0, 5.1]
 
 CARD_WIDTH = 3.5
 CARD_HEIGHT = 2
+CARD_DPI = 100
+
+# RGB of ColorHex.white, used to fill the unused spots on a print page
+PAGE_BACKGROUND: Final = (255, 255, 255)
+
+# fast, light zlib compression for the per-card PNGs, which are mostly flat color, tagged with the card DPI so
+# they print at business card size
+CARD_PNG_OPTS: Final = {"compress_level": 1, "dpi": (CARD_DPI, CARD_DPI)}
+
+TEXT_OPTS: Final = {
+    "horizontalalignment": "center",
+    "verticalalignment": "center",
+}
+SQUARE_TEXT_BBOX: Final = {"facecolor": "#CCCCCC", "alpha": 0.5}
+SQUARE_TEXT_OPTS: Final = TEXT_OPTS | {"fontsize": "x-small", "bbox": SQUARE_TEXT_BBOX}
+RES_TEXT_OPTS: Final = TEXT_OPTS | {"fontsize": "large", "fontweight": "bold"}
+
+# attribute under which generate_card keeps handles to the card artists it created on an Axes
+CARD_ARTISTS_ATTR: Final = "_card_artists"
 
 
 class ColorHex(str, Enum):
@@ -66,31 +100,39 @@ class ColorAbbr(str, Enum):
         return self.value
 
 
-@dataclass
-class PolygonCoords:
-    """x and y coordinates of a polygon"""
+# (hex color, abbreviation) for every color name, including aliases like "grey"
+COLOR_STYLES: Final[dict[str, tuple[str, str]]] = {
+    name: (hex_color.value, ColorAbbr[name].value) for name, hex_color in ColorHex.__members__.items()
+}
+
 
-    x: list[float]
-    y: list[float]
+def resolve_bands(
+    rval: ResistorValue, four_box_tol: float = 5, five_box_tol: float = 1
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """Resolve the (hex color, abbreviation) of each box of the four- and five-band color codes for a value"""
+    four_colors = [*rval.as_three_bands, TolerancePercentColor(four_box_tol).name]
+    five_colors = [*rval.as_four_bands, TolerancePercentColor(five_box_tol).name]
+    return [COLOR_STYLES[color] for color in four_colors], [COLOR_STYLES[color] for color in five_colors]
 
 
-@dataclass(init=False)
-class Square(PolygonCoords):
-    """x and y coordinates of a square, created from a bottom-left coordinate and side length"""
+# corners of the unit square, counterclockwise from the bottom left
+UNIT_SQUARE: Final = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
 
-    center_x: float
-    center_y: float
 
-    def __init__(self, x0: float, y0: float, side: float):
-        self.x = [x0, x0 + side, x0 + side, x0]
-        self.y = [y0, y0, y0 + side, y0 + side]
-        self.center_x = x0 + side / 2
-        self.center_y = y0 + side / 2
+def gen_squares(x0: np.ndarray, y0: float, side: float) -> tuple[np.ndarray, np.ndarray]:
+    """Generate the corners (n, 4, 2) and centers (n, 2) of n squares from their bottom-left x coordinates, a
+    shared bottom y coordinate and side length"""
+    origins = np.stack([x0, np.full_like(x0, y0)], axis=-1)
+    return origins[:, np.newaxis, :] + side * UNIT_SQUARE, origins + side / 2
 
 
-def gen_squares_coords(sq_side: float, spacing: float) -> tuple[list[Square], list[Square]]:
+@lru_cache(maxsize=8)
+def gen_squares_coords(sq_side: float, spacing: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """Generate coordinates for a set of four and and a set of five boxes on the business card
 
+    The result is cached per (sq_side, spacing), so the returned arrays are shared between calls and are
+    read-only.
+
     Parameters
     ----------
     sq_side
@@ -100,10 +142,14 @@ def gen_squares_coords(sq_side: float, spacing: float) -> tuple[list[Square], li
 
     Returns
     -------
-    four_box_coords
-        List of Square coordinate objects for the set of four squares
-    five_box_coords
-        List of Square coordinate objects for the set of five squares
+    four_box_verts
+        (4, 4, 2) array of the x, y corners of each of the set of four squares
+    four_box_centers
+        (4, 2) array of the x, y centers of each of the set of four squares
+    five_box_verts
+        (5, 4, 2) array of the x, y corners of each of the set of five squares
+    five_box_centers
+        (5, 2) array of the x, y centers of each of the set of five squares
 
     """
 
@@ -113,117 +159,228 @@ def gen_squares_coords(sq_side: float, spacing: float) -> tuple[list[Square], li
     four_box_x0 = five_box_x0 + sq_side / 2 + spacing / 2
     four_box_y0 = five_box_y0 + sq_side + 2 * spacing
 
-    four_box_coords = [Square(four_box_x0 + i * (sq_side + spacing), four_box_y0, sq_side) for i in range(4)]
-
-    five_box_coords = [Square(five_box_x0 + i * (sq_side + spacing), five_box_y0, sq_side) for i in range(5)]
+    four_box_verts, four_box_centers = gen_squares(
+        four_box_x0 + np.arange(4) * (sq_side + spacing), four_box_y0, sq_side
+    )
+    five_box_verts, five_box_centers = gen_squares(
+        five_box_x0 + np.arange(5) * (sq_side + spacing), five_box_y0, sq_side
+    )
 
-    return four_box_coords, five_box_coords
+    coords = four_box_verts, four_box_centers, five_box_verts, five_box_centers
+    for arr in coords:
+        arr.flags.writeable = False
+    return coords
 
 
-def gen_border(ax: Axes, margin: float, linewidth: float = 1):
+def gen_border(ax: Axes, margin: float, linewidth: float = 1) -> Line2D:
     """Generate a border around the business card at some margin in from the edge"""
     x = [margin, CARD_WIDTH - margin, CARD_WIDTH - margin, margin, margin]
     y = [margin, margin, CARD_HEIGHT - margin, CARD_HEIGHT - margin, margin]
-    ax.plot(x, y, "-k", linewidth=linewidth)
+    (border,) = ax.plot(x, y, "-k", linewidth=linewidth)
+    return border
+
+
+def _setup_card_axes(ax: Axes):
+    """Make ax cover its whole figure with business card data limits"""
+    ax.set_position([0, 0, 1, 1])
+    # the figure already has the card's proportions, so equal aspect never has to resize anything
+    ax.set_aspect("equal", adjustable="box")
+    ax.set_xlim(0, CARD_WIDTH)
+    ax.set_ylim(0, CARD_HEIGHT)
+    # the ticks would fall outside the figure anyway; not having any skips generating them on every draw
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+
+def new_card_axes() -> tuple[Figure, Axes]:
+    """Create a business-card-sized figure with a single Axes covering it, ready for generate_card"""
+    # a bare Agg canvas rather than pyplot, so the figure isn't tracked by pyplot and needn't be closed
+    fig = Figure(figsize=(CARD_WIDTH, CARD_HEIGHT), dpi=CARD_DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    _setup_card_axes(ax)
+    return fig, ax
+
+
+def _draw_card_artists(ax: Axes) -> dict[str, Any]:
+    """Create the artists of a business card on ax with placeholder content and return handles to them"""
+    four_verts, four_centers, five_verts, five_centers = gen_squares_coords(sq_side=0.45, spacing=0.1)
+
+    box_patches = PolyCollection(np.concatenate([five_verts, four_verts]), facecolors=ColorHex["none"].value)
+    ax.add_collection(box_patches)
+    box_texts = [
+        ax.text(x, y, "", **SQUARE_TEXT_OPTS) for x, y in np.concatenate([five_centers, four_centers]).tolist()
+    ]
+
+    res_text_x = CARD_WIDTH / 2
+    res_text_y = 1.6
+    five_band_txt_y0 = 0.4
+    four_band_txt_y0 = five_band_txt_y0 + 0.45 + 0.2
+    five_band_txt_x0 = 0.35
+    four_band_txt_x0 = 0.6
+    return {
+        # one patch and label per box: the five-band boxes followed by the four-band boxes
+        "box_patches": box_patches,
+        "box_texts": box_texts,
+        "title": ax.text(res_text_x, res_text_y, "", **RES_TEXT_OPTS),
+        "five_tol": ax.text(five_band_txt_x0, five_band_txt_y0, "", **RES_TEXT_OPTS),
+        "four_tol": ax.text(four_band_txt_x0, four_band_txt_y0, "", **RES_TEXT_OPTS),
+        "border": gen_border(ax, 0.05),
+    }
+
+
+def _card_artists(ax: Axes) -> dict[str, Any] | None:
+    """Return the handles to the card artists drawn on ax, or None if there are none or any of them was
+    cleared or removed from ax since"""
+    artists = getattr(ax, CARD_ARTISTS_ATTR, None)
+    if artists is None:
+        return None
+    handles = [artists["box_patches"], *artists["box_texts"]]
+    handles += [artists[name] for name in ("title", "five_tol", "four_tol", "border")]
+    if any(artist.axes is not ax for artist in handles):
+        return None
+    return artists
 
 
 def generate_card(
     rval: ResistorValue, four_box_tol: float = 5, five_box_tol: float = 1, figax: Figure | Axes | None = None
 ) -> tuple[Figure, Axes]:
-    """Generate a business card for a certain value and tolerances for the four- and five- band version"""
+    """Generate a business card for a certain value and tolerances for the four- and five- band version
+
+    The card artists are created on the first call for a given Axes and kept as handles on it, so passing the
+    returned Axes (or Figure) back in only updates colors and text instead of rebuilding the Axes. Any other
+    Axes is cleared and set up like a new card, and any other Figure is cleared and given a new card Axes.
+    """
     if isinstance(figax, Figure):
         fig = figax
-        figax.clf()
-        ax = figax.add_axes((0, 0, 1, 1))
+        # reuse the Axes of a figure this function already drew a card on, otherwise start the figure over
+        card_axes = [ax for ax in fig.axes if _card_artists(ax) is not None]
+        if card_axes:
+            ax = card_axes[0]
+        else:
+            fig.clf()
+            ax = fig.add_axes((0, 0, 1, 1))
     elif isinstance(figax, Axes):
         ax = figax
         fig = figax.figure
-        ax.cla()
-        ax.set_position([0, 0, 1, 1])
     else:
-        fig, ax = plt.subplots()
-        ax.set_position([0, 0, 1, 1])
+        fig, ax = new_card_axes()
 
-    four_colors = [*rval.as_three_bands(), TolerancePercentColor(four_box_tol).name]
-    five_colors = [*rval.as_four_bands(), TolerancePercentColor(five_box_tol).name]
+    artists = _card_artists(ax)
+    if artists is None:
+        ax.cla()
+        _setup_card_axes(ax)
+        fig.set_size_inches(CARD_WIDTH, CARD_HEIGHT)
+        fig.set_dpi(CARD_DPI)
+        artists = _draw_card_artists(ax)
+        setattr(ax, CARD_ARTISTS_ATTR, artists)
 
-    four_coords, five_coords = gen_squares_coords(sq_side=0.45, spacing=0.1)
+    four_styles, five_styles = resolve_bands(rval, four_box_tol, five_box_tol)
 
-    text_opts = {
-        "horizontalalignment": "center",
-        "verticalalignment": "center",
-    }
-    square_text_opts = text_opts | {"fontsize": "x-small", "bbox": {"facecolor": "#CCCCCC", "alpha": 0.5}}
-    for color, square in zip(five_colors, five_coords):
-        ax.fill(square.x, square.y, ColorHex[color])
-        ax.text(square.center_x, square.center_y, ColorAbbr[color], **square_text_opts)
+    box_styles = five_styles + four_styles
+    artists["box_patches"].set_facecolor([hex_color for hex_color, _ in box_styles])
+    for (_, abbr), text in zip(box_styles, artists["box_texts"]):
+        text.set_text(abbr)
 
-    for color, square in zip(four_colors, four_coords):
-        ax.fill(square.x, square.y, ColorHex[color])
-        ax.text(square.center_x, square.center_y, ColorAbbr[color], **square_text_opts)
+    artists["title"].set_text(str(rval))
+    artists["five_tol"].set_text(f"{five_box_tol:g}%")
+    artists["four_tol"].set_text(f"{four_box_tol:g}%")
 
-    res_text_x = CARD_WIDTH / 2
-    res_text_y = 1.6
-    five_band_txt_y0 = 0.4
-    four_band_txt_y0 = five_band_txt_y0 + 0.45 + 0.2
-    five_band_txt_x0 = 0.35
-    four_band_txt_x0 = 0.6
-    res_text_opts = text_opts | {"fontsize": "large", "fontweight": "bold"}
-    ax.text(res_text_x, res_text_y, str(rval), **res_text_opts)
-    ax.text(five_band_txt_x0, five_band_txt_y0, f"{five_box_tol:g}%", **res_text_opts)
-    ax.text(four_band_txt_x0, four_band_txt_y0, f"{four_box_tol:g}%", **res_text_opts)
-    gen_border(ax, 0.05)
+    return fig, ax
 
-    ax.axis("equal")
-    ax.set_xlim(0, CARD_WIDTH)
-    ax.set_ylim(0, CARD_HEIGHT)
-    fig.set_figheight(CARD_HEIGHT)
-    fig.set_figwidth(CARD_WIDTH)
 
-    return fig, ax
+def card_to_array(fig: Figure) -> np.ndarray:
+    """Rasterize a card figure and return its pixels as a height x width x 3 uint8 RGB array. Figures without a
+    raster canvas (e.g. a bare Figure()) get an Agg canvas attached."""
+    if not hasattr(fig.canvas, "buffer_rgba"):
+        FigureCanvasAgg(fig)
+    fig.canvas.draw()
+    # buffer_rgba is a view of the canvas' own buffer, which the next draw overwrites, so keep a copy
+    return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+def generate_card_array(
+    rval: ResistorValue, four_box_tol: float = 5, five_box_tol: float = 1, figax: Figure | Axes | None = None
+) -> np.ndarray:
+    """Generate a business card like generate_card and return its pixels as a height x width x 3 uint8 array"""
+    fig, _ = generate_card(rval, four_box_tol, five_box_tol, figax)
+    return card_to_array(fig)
+
+
+def _render_cards(
+    img_dir: Path | None,
+    numbered_rvalues: list[tuple[int, ResistorValue]],
+    four_box_tol: float,
+    five_box_tol: float,
+) -> list[np.ndarray]:
+    """Render the cards for a chunk of (card number, value) pairs, reusing one figure for the whole chunk, and
+    save them as PNGs in img_dir if it is given"""
+    _, ax = new_card_axes()
+    cards = []
+    for i, rval in numbered_rvalues:
+        card = generate_card_array(rval, four_box_tol, five_box_tol, ax)
+        if img_dir is not None:
+            Image.fromarray(card).save(img_dir / f"{i:03d}-{rval}.png", **CARD_PNG_OPTS)
+        cards.append(card)
+    return cards
 
 
 def generate_cards(
-    img_dir: Path,
+    img_dir: Path | None,
     values: list[float],
     exponents: Iterable[int],
     four_box_tol: float = 5,
     five_box_tol: float = 1,
-):
-    """Generate and save a series of business card images for a given list of values and exponents (10*n).
+    max_workers: int | None = None,
+) -> list[np.ndarray]:
+    """Generate a series of business card images for a given list of values and exponents (10*n) and return
+    them as RGB arrays, also saving them as PNGs in img_dir unless it is None.
     four_box_tol and five_box_tol specify the tolerance percent value to use for the four- and five-band
-    color boxes, respectively.
+    color boxes, respectively. The cards are split into one chunk per worker process and rendered in parallel;
+    max_workers defaults to the number of CPUs.
     """
     rvalues = [ResistorValue.from_float(val * 10.0**exp) for exp in exponents for val in sorted(values)]
-    fig = None
-    for i, rval in enumerate(rvalues):
-        fig, _ = generate_card(rval, four_box_tol, five_box_tol, fig)
-        fig.savefig(str(img_dir / f"{i:03d}-{rval}.png"))
-
-
-def gen_print_page(png_paths: list[Path], nrows, ncols, page_png_path: Path):
-    """Generate a page of images from a series of images in row and columns. Expects that the images are all
-    the same dimensions."""
-    with Image.open(png_paths[0]) as sample_im:
-        card_w = sample_im.width
-        card_h = sample_im.height
-    base_im = Image.new("RGB", (card_w * ncols, card_h * nrows), color=str(ColorHex["white"]))
-    for i, png_path in enumerate(png_paths):
-        with Image.open(png_path) as im:
-            base_im.paste(im, box=((i % ncols) * card_w, (i // ncols) * card_h))
-    base_im.save(page_png_path)
-
-
-def gen_print_pages(png_dir: Path):
-    """Generate pages of images of all the images in the png_dir"""
+    numbered_rvalues = list(enumerate(rvalues))
+    n_workers = max(1, min(max_workers or os.cpu_count() or 1, len(numbered_rvalues)))
+    chunk_size = max(1, -(-len(numbered_rvalues) // n_workers))
+    chunks = [numbered_rvalues[i : i + chunk_size] for i in range(0, len(numbered_rvalues), chunk_size)]
+    render_chunk = partial(_render_cards, img_dir, four_box_tol=four_box_tol, five_box_tol=five_box_tol)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return [card for chunk_cards in executor.map(render_chunk, chunks) for card in chunk_cards]
+
+
+def _load_card(png_path: Path) -> np.ndarray:
+    """Load a card PNG as an RGB array"""
+    with Image.open(png_path, formats=["PNG"]) as im:
+        im.load()
+        return np.asarray(im.convert("RGB"))
+
+
+def gen_print_page(cards: Sequence[Path | np.ndarray], nrows, ncols, page_png_path: Path):
+    """Generate a page of images from a series of images in row and columns. The images can be given as PNG
+    paths or as RGB card arrays. Expects that the images are all the same dimensions."""
+    cards = [_load_card(card) if isinstance(card, Path) else card for card in cards]
+    card_h, card_w = cards[0].shape[:2]
+    page = np.full((card_h * nrows, card_w * ncols, 3), PAGE_BACKGROUND, dtype=np.uint8)
+    for i, card in enumerate(cards):
+        row = (i // ncols) * card_h
+        col = (i % ncols) * card_w
+        page[row : row + card_h, col : col + card_w] = card
+    Image.fromarray(page).save(page_png_path)
+
+
+def gen_print_pages(png_dir: Path, cards: Sequence[Path | np.ndarray] | None = None):
+    """Generate pages of images in the png_dir from the given card PNG paths or RGB card arrays, or from all the
+    images in the png_dir if no cards are given"""
     # delete existing pages of pngs
     prefix = "page"
     for p in png_dir.glob("page*.png"):
         p.unlink()
-    pngs = sorted(png_dir.glob("*.png"))
-    for page_i, i in enumerate(range(0, len(pngs), 10)):
+    if cards is None:
+        cards = sorted(png_dir.glob("*.png"))
+    for page_i, i in enumerate(range(0, len(cards), 10)):
         page_png_path = png_dir / f"{prefix}_{page_i:02d}.png"
-        gen_print_page(pngs[i : i + 10], 5, 2, page_png_path)
+        gen_print_page(cards[i : i + 10], 5, 2, page_png_path)
 
 
 if __name__ == "__main__":
@@ -231,5 +388,5 @@ if __name__ == "__main__":
     extras = [3.0, 5.1]
     values = E_12 + extras
     png_dir.mkdir(exist_ok=True)
-    generate_cards(png_dir, values=values, exponents=range(-1, 7))
-    gen_print_pages(png_dir)
+    cards = generate_cards(png_dir, values=values, exponents=range(-1, 7))
+    gen_print_pages(png_dir, cards)